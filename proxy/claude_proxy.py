@@ -2,7 +2,7 @@
 """
 PageFault Claude - Host-side proxy
 
-Pure API bridge: reads Q: queries from serial, calls Claude, sends A: responses.
+Pure API bridge: reads Q: queries from serial, calls Claude, streams A: responses.
 User input comes from the PS/2 keyboard (typed in the QEMU window), NOT from
 the proxy terminal. All serial traffic is logged to the screen.
 
@@ -22,12 +22,69 @@ Usage:
 """
 
 import argparse
+import asyncio
+import errno
+import json
+import logging
+import os
 import socket
+import sqlite3
+import stat
 import sys
 import time
+import urllib.request
 
 EOT = b"\x04"
 
+HAVE_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+log = logging.getLogger("proxy")
+
+MODEL = "claude-sonnet-4-5-20250929"
+
+# Kept byte-for-byte stable across calls so it can be served from the
+# prompt cache. Don't interpolate timestamps or per-session data here.
+SYSTEM_PROMPT = ("You are responding via a bizarre x86 page fault weird machine. "
+                 "Keep responses concise (1-3 paragraphs). Be helpful and fun.")
+
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+EXTENDED_CACHE_TTL_BETA = "extended-cache-ttl-2025-04-11"
+
+# Idle pooled connections are kept for KEEPALIVE_EXPIRY seconds; pinging
+# a little more often than that means the first query after a quiet
+# spell doesn't pay for a new TLS handshake.
+KEEPALIVE_EXPIRY = 300.0
+KEEPALIVE_INTERVAL = 240.0
+
+# --batch mode: queries arriving within BATCH_WINDOW seconds of each other
+# are sent together, at most BATCH_CONCURRENCY requests in flight.
+BATCH_WINDOW = 0.05
+BATCH_CONCURRENCY = 5
+
+# Longest line kept from the kernel; the rest of a longer line is dropped.
+SERIAL_LINE_LIMIT = 64 * 1024
+
+# --io-uring: size of each recv buffer handed to the kernel
+IO_URING_RECV_SIZE = 4096
+
+# Longest prompt forwarded to the API; anything longer is cut down to
+# this many characters, marker included.
+MAX_PROMPT_CHARS = 4000
+TRUNCATION_MARKER = "…[truncated]"
+EMPTY_PROMPT_REPLY = "[Empty prompt]"
+
+_client = None
+_truncation_warned = False
+
+# Semantic response cache: prompts whose embedding is close enough to an
+# earlier prompt are answered locally instead of going to the API.
+CACHE_DB = os.path.expanduser("~/.cache/pagefault_claude/responses.db")
+CACHE_SIMILARITY = 0.92
+CACHE_TTL_SECONDS = 3600
+NOCACHE_PREFIX = "#nocache"
+OLLAMA_URL = "http://127.0.0.1:11434"
+EMBED_MODEL = "nomic-embed-text"
+
 BANNER = """
 ╔═══════════════════════════════════════════════════════╗
 ║  PageFault Claude - Weird Machine Proxy               ║
@@ -36,85 +93,838 @@ BANNER = """
 ║  Type in the QEMU window, not here.                   ║
 ╚═══════════════════════════════════════════════════════╝
 """
+BANNER_BYTES = (BANNER + "\n").encode("utf-8")  # as print() would write it
+
+
+def create_http_client():
+    """Create the pooled HTTP client shared by every API call.
+
+    HTTP/2 is used when the optional 'h2' package is installed so all
+    requests multiplex over one TLS connection; otherwise HTTP/1.1.
+    """
+    import anthropic
+    import httpx
+    options = dict(
+        limits=httpx.Limits(max_keepalive_connections=4,
+                            keepalive_expiry=KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    try:
+        return anthropic.DefaultAsyncHttpxClient(http2=True, **options)
+    except ImportError:
+        return anthropic.DefaultAsyncHttpxClient(**options)
+
 
+def create_anthropic_client(cache_ttl=5):
+    """Create Anthropic client. API key from environment.
 
-def create_anthropic_client():
-    """Create Anthropic client. API key from environment."""
+    The client (and its connection pool) is created once and reused for
+    every query.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    betas = [PROMPT_CACHING_BETA]
+    if cache_ttl == 60:
+        betas.append(EXTENDED_CACHE_TTL_BETA)
     try:
         import anthropic
-        return anthropic.Anthropic()
+        _client = anthropic.AsyncAnthropic(
+            default_headers={"anthropic-beta": ",".join(betas)},
+            http_client=create_http_client())
+        return _client
     except ImportError:
-        print("ERROR: 'anthropic' package not installed. Run: pip install anthropic",
-              file=sys.stderr)
+        log.error("ERROR: 'anthropic' package not installed. Run: pip install anthropic")
         sys.exit(1)
     except Exception as e:
-        print(f"ERROR: Failed to create Anthropic client: {e}", file=sys.stderr)
-        print("Make sure ANTHROPIC_API_KEY is set.", file=sys.stderr)
+        log.error("ERROR: Failed to create Anthropic client: %s", e)
+        log.error("Make sure ANTHROPIC_API_KEY is set.")
         sys.exit(1)
 
 
-def query_claude(client, prompt):
-    """Send a prompt to Claude and return the response text."""
+async def ping_claude(client):
+    """Make a cheap API call that keeps the pooled connection open."""
+    try:
+        await client.messages.count_tokens(
+            model=MODEL, messages=[{"role": "user", "content": "ping"}])
+    except Exception as e:
+        log.warning("[keepalive] %s", e)
+
+
+async def keepalive(client, interval=KEEPALIVE_INTERVAL):
+    """Ping the API immediately and then every interval seconds until cancelled.
+
+    The first ping runs while the kernel is still booting, so the TLS
+    connection is already open when the first real query arrives.
+    """
+    while True:
+        await ping_claude(client)
+        await asyncio.sleep(interval)
+
+
+class SemanticCache:
+    """Local cache of Claude responses, looked up by prompt similarity.
+
+    Embeddings come from a local Ollama server; nearest-neighbour search
+    runs inside SQLite via the sqlite-vec extension. Methods block, so
+    async callers run them with asyncio.to_thread.
+    """
+
+    def __init__(self, path, similarity=CACHE_SIMILARITY, ttl=CACHE_TTL_SECONDS,
+                 ollama_url=OLLAMA_URL, embed_model=EMBED_MODEL):
+        import sqlite_vec
+        self.similarity = similarity
+        self.ttl = ttl
+        self.ollama_url = ollama_url
+        self.embed_model = embed_model
+        self._serialize = sqlite_vec.serialize_float32
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.enable_load_extension(True)
+        sqlite_vec.load(self.db)
+        self.db.enable_load_extension(False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(embedding BLOB, prompt TEXT, response TEXT, ts INTEGER)")
+        self.db.commit()
+
+    def embed(self, text):
+        """Return the embedding of text as a float32 blob."""
+        request = urllib.request.Request(
+            f"{self.ollama_url}/api/embeddings",
+            data=json.dumps({"model": self.embed_model, "prompt": text}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            return self._serialize(json.load(resp)["embedding"])
+
+    def lookup(self, prompt):
+        """Return (embedding, cached response or None) for prompt.
+
+        The embedding is None if the embedding server could not be reached
+        or the database could not be searched (e.g. it is locked by another
+        proxy), in which case the lookup is a miss and nothing should be
+        stored.
+        """
+        try:
+            embedding = self.embed(prompt)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("[cache] embedding failed: %s", e)
+            return None, None
+        try:
+            row = self.db.execute(
+                "SELECT response, vec_distance_cosine(embedding, ?) AS distance "
+                "FROM responses WHERE ts >= ? ORDER BY distance LIMIT 1",
+                (embedding, int(time.time()) - self.ttl),
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning("[cache] lookup failed: %s", e)
+            return None, None
+        if row is not None and 1.0 - row[1] >= self.similarity:
+            log.info("[cache] hit (similarity %.3f)", 1.0 - row[1])
+            return embedding, row[0]
+        return embedding, None
+
+    def store(self, embedding, prompt, response):
+        """Remember response for prompt, dropping entries that have expired.
+
+        Lookups scan every row, so expired ones are deleted here rather
+        than left to slow every later lookup down.
+        """
+        if embedding is None:
+            return
+        now = int(time.time())
+        try:
+            with self.db:
+                self.db.execute("DELETE FROM responses WHERE ts < ?", (now - self.ttl,))
+                self.db.execute(
+                    "INSERT INTO responses (embedding, prompt, response, ts) "
+                    "VALUES (?, ?, ?, ?)",
+                    (embedding, prompt, response, now),
+                )
+        except sqlite3.Error as e:
+            log.warning("[cache] store failed: %s", e)
+
+    def close(self):
+        self.db.close()
+
+
+def open_semantic_cache(path=CACHE_DB):
+    """Open the semantic cache, or return None if it is unavailable.
+
+    The embedding server is probed once here, so a missing or hung Ollama
+    doesn't cost every query a failed request.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cache = SemanticCache(path)
+    except ImportError:
+        log.warning("WARNING: 'sqlite-vec' package not installed; response cache "
+                    "disabled. Run: pip install sqlite-vec")
+        return None
+    except (AttributeError, OSError, sqlite3.Error) as e:
+        log.warning("WARNING: Response cache disabled: %s", e)
+        return None
+    try:
+        cache.embed("ping")
+    except (OSError, ValueError, KeyError) as e:
+        log.warning("WARNING: Response cache disabled: no embedding server at %s (%s)",
+                    cache.ollama_url, e)
+        cache.close()
+        return None
+    return cache
+
+
+def system_blocks(cache_ttl=5):
+    """Build the system prompt as a single cacheable content block."""
+    cache_control = {"type": "ephemeral"}
+    if cache_ttl == 60:
+        cache_control["ttl"] = "1h"
+    return [{"type": "text", "text": SYSTEM_PROMPT,
+             "cache_control": cache_control}]
+
+
+def clamp_prompt(prompt):
+    """Bound a kernel prompt before it goes to the API.
+
+    Returns None for empty or whitespace-only prompts, and cuts prompts
+    longer than MAX_PROMPT_CHARS down to size (warning the first time).
+    """
+    global _truncation_warned
+    if not prompt.strip():
+        return None
+    if len(prompt) > MAX_PROMPT_CHARS:
+        if not _truncation_warned:
+            log.warning("WARNING: truncating %d-character prompt to %d characters",
+                        len(prompt), MAX_PROMPT_CHARS)
+            _truncation_warned = True
+        prompt = prompt[:MAX_PROMPT_CHARS - len(TRUNCATION_MARKER)] + TRUNCATION_MARKER
+    return prompt
+
+
+async def query_claude(client, prompt, system=None, cache=None):
+    """Send a prompt to Claude and yield the response text as it streams in.
+
+    If a SemanticCache is given, a sufficiently similar earlier prompt is
+    answered from it without touching the network. API errors are yielded
+    as text so the kernel always gets a complete, EOT-terminated answer.
+    """
+    prompt = clamp_prompt(prompt)
+    if prompt is None:
+        yield EMPTY_PROMPT_REPLY
+        return
+    if system is None:
+        system = system_blocks()
+    embedding = None
+    if cache is not None:
+        embedding, cached = await asyncio.to_thread(cache.lookup, prompt)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
+        async with client.messages.stream(
+            model=MODEL,
             max_tokens=512,
-            system="You are responding via a bizarre x86 page fault weird machine. "
-                   "Keep responses concise (1-3 paragraphs). Be helpful and fun.",
+            system=system,
             messages=[{"role": "user", "content": prompt}],
-        )
-        return response.content[0].text
+        ) as stream:
+            async for text in stream.text_stream:
+                parts.append(text)
+                yield text
     except Exception as e:
-        return f"[API Error: {e}]"
+        yield f"[API Error: {e}]"
+        return
+    if cache is not None:
+        await asyncio.to_thread(cache.store, embedding, prompt, "".join(parts))
+
+
+async def query_claude_batch(client, prompts, system=None,
+                             concurrency=BATCH_CONCURRENCY):
+    """Send prompts to Claude concurrently and return the responses in order.
+
+    At most concurrency requests are in flight at once, to stay inside the
+    account's rate limits.
+    """
+    if system is None:
+        system = system_blocks()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(prompt):
+        async with semaphore:
+            try:
+                response = await client.messages.create(
+                    model=MODEL,
+                    max_tokens=512,
+                    system=system,
+                    messages=[{"role": "user", "content": prompt}],
+                )
+            except Exception as e:
+                return f"[API Error: {e}]"
+            return response.content[0].text
+
+    return await asyncio.gather(*(one(prompt) for prompt in prompts))
+
+
+async def answer_batch(client, queries, system, cache):
+    """Answer a list of kernel queries, from the cache where possible."""
+    responses = [None] * len(queries)
+    misses = []
+    for i, query in enumerate(queries):
+        query_cache = cache
+        if query.startswith(NOCACHE_PREFIX):
+            query = query[len(NOCACHE_PREFIX):].lstrip()
+            query_cache = None
+        query = clamp_prompt(query)
+        if query is None:
+            responses[i] = EMPTY_PROMPT_REPLY
+            continue
+        embedding = None
+        if query_cache is not None:
+            embedding, responses[i] = await asyncio.to_thread(query_cache.lookup, query)
+        if responses[i] is None:
+            misses.append((i, query, query_cache, embedding))
+
+    if misses:
+        prompts = [query for _, query, _, _ in misses]
+        texts = await query_claude_batch(client, prompts, system)
+        for (i, query, query_cache, embedding), text in zip(misses, texts):
+            responses[i] = text
+            if query_cache is not None and not text.startswith("[API Error:"):
+                await asyncio.to_thread(query_cache.store, embedding, query, text)
+    return responses
+
+
+def sendmsg_nowait(sock, parts):
+    """Send parts from a non-blocking socket with sendmsg(), without joining them.
+
+    Returns whatever the socket would not take without blocking, as a list
+    of memoryviews (empty if everything was sent).
+    """
+    views = [memoryview(part) for part in parts if part]
+    while views:
+        try:
+            sent = sock.sendmsg(views)
+        except BlockingIOError:
+            break
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if sent:
+            views[0] = views[0][sent:]
+    return views
+
+
+class IoUringStream:
+    """Serial socket whose reads are done with io_uring (Linux only).
+
+    A 4 KB recv is kept armed against the socket. Completions are signalled
+    through an eventfd watched by the event loop, and each wakeup reaps
+    every ready CQE into an asyncio StreamReader, so SerialConnection reads
+    lines exactly as it does on the plain asyncio path. Only one recv is in
+    flight at a time, since several recvs on one TCP socket aren't
+    guaranteed to complete in stream order. Also provides the subset of
+    asyncio.StreamWriter that SerialConnection uses.
+    """
+
+    def __init__(self, sock):
+        import liburing
+        self.sock = sock
+        self.reader = asyncio.StreamReader(limit=SERIAL_LINE_LIMIT)
+        self._liburing = liburing
+        self._loop = asyncio.get_running_loop()
+        self._ring = liburing.Ring()
+        self._cqe = liburing.Cqe()
+        self._buf = bytearray(IO_URING_RECV_SIZE)
+        self._pending = []
+        self._closing = False
+        self._closed = self._loop.create_future()
+        try:
+            # Only the event loop thread touches the ring, and completions
+            # are collected when we ask for them (Linux 6.1+).
+            liburing.io_uring_queue_init(
+                8, self._ring, liburing.IORING_SETUP_SINGLE_ISSUER
+                | liburing.IORING_SETUP_DEFER_TASKRUN)
+            self._defer_taskrun = True
+        except OSError:
+            liburing.io_uring_queue_init(8, self._ring)
+            self._defer_taskrun = False
+        try:
+            self._eventfd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            liburing.io_uring_register_eventfd(self._ring, self._eventfd)
+        except OSError:
+            liburing.io_uring_queue_exit(self._ring)
+            raise
+        self._loop.add_reader(self._eventfd, self._reap)
+        self._arm()
+
+    def _arm(self):
+        sqe = self._liburing.io_uring_get_sqe(self._ring)
+        self._liburing.io_uring_prep_recv(sqe, self.sock.fileno(), self._buf)
+        self._liburing.io_uring_submit(self._ring)
+
+    def _reap(self):
+        """Feed every completed recv to the reader and re-arm."""
+        liburing = self._liburing
+        try:
+            os.eventfd_read(self._eventfd)
+        except BlockingIOError:
+            pass
+        if self._defer_taskrun:
+            liburing.io_uring_get_events(self._ring)
+        while True:
+            try:
+                liburing.io_uring_peek_cqe(self._ring, self._cqe)
+            except BlockingIOError:
+                return
+            res = self._cqe[0].res
+            liburing.io_uring_cqe_seen(self._ring, self._cqe[0])
+            if res == -errno.EAGAIN and not self._closing:
+                self._arm()
+            elif res < 0:
+                self.reader.set_exception(OSError(-res, os.strerror(-res)))
+                return self._teardown()
+            elif res == 0:
+                self.reader.feed_eof()
+                return self._teardown()
+            else:
+                self.reader.feed_data(bytes(self._buf[:res]))
+                self._arm()
+
+    def _teardown(self):
+        self._loop.remove_reader(self._eventfd)
+        self._liburing.io_uring_queue_exit(self._ring)
+        os.close(self._eventfd)
+        self.sock.close()
+        self._closed.set_result(None)
+
+    def writelines(self, parts):
+        self._pending.extend(parts)
+
+    async def drain(self):
+        parts, self._pending = self._pending, []
+        if self._closed.done():
+            raise ConnectionError("Serial connection closed")
+        rest = sendmsg_nowait(self.sock, parts)
+        if rest:
+            await self._loop.sock_sendall(self.sock, b"".join(rest))
+
+    def close(self):
+        # Completes the armed recv with EOF, which tears the ring down
+        self._closing = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    async def wait_closed(self):
+        await self._closed
+
+
+class RegularFileReader:
+    """Feeds a regular file into an asyncio StreamReader from a worker thread.
+
+    Event loops can't watch regular files (epoll rejects them), so pipe
+    mode uses this when stdin is redirected from a file.
+    """
+
+    def __init__(self, fd, reader):
+        self._file = os.fdopen(os.dup(fd), "rb", buffering=0)
+        self._task = asyncio.create_task(self._pump(reader))
+
+    async def _pump(self, reader):
+        while True:
+            data = await asyncio.to_thread(self._file.read, 65536)
+            if not data:
+                reader.feed_eof()
+                return
+            reader.feed_data(data)
+
+    def close(self):
+        self._task.cancel()
+        self._file.close()
+
+
+class RegularFileWriter:
+    """Writes to a regular file from a worker thread.
+
+    Pipe mode uses this when stdout is redirected to a file. Provides the
+    subset of asyncio.StreamWriter that SerialConnection uses.
+    """
+
+    def __init__(self, fd):
+        self._file = os.fdopen(os.dup(fd), "wb")
+        self._pending = []
+
+    def writelines(self, parts):
+        self._pending.extend(parts)
+
+    async def drain(self):
+        parts, self._pending = self._pending, []
+        await asyncio.to_thread(self._write, parts)
+
+    def _write(self, parts):
+        self._file.writelines(parts)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def is_regular_file(fd):
+    return stat.S_ISREG(os.fstat(fd).st_mode)
 
 
 class SerialConnection:
-    """Abstraction over TCP socket or stdin/stdout for serial communication."""
+    """Abstraction over TCP socket or stdin/stdout for serial communication.
+
+    Both modes are driven through an asyncio StreamReader/StreamWriter pair,
+    so waiting on the kernel never blocks an in-flight API call.
+    """
 
-    def __init__(self, mode, host="127.0.0.1", port=4321):
+    def __init__(self, mode, reader, writer, read_transport=None, sock=None):
         self.mode = mode
-        if mode == "tcp":
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            print(f"Connecting to QEMU serial at {host}:{port}...", file=sys.stderr)
-            for attempt in range(30):
-                try:
-                    self.sock.connect((host, port))
-                    print("Connected.", file=sys.stderr)
-                    return
-                except ConnectionRefusedError:
-                    if attempt < 29:
-                        time.sleep(1)
-            print("ERROR: Could not connect to QEMU serial port.", file=sys.stderr)
+        self.reader = reader
+        self.writer = writer
+        self._read_transport = read_transport
+        self._sock = sock
+
+    @classmethod
+    async def open(cls, mode, host="127.0.0.1", port=4321, connect_retries=30,
+                   io_uring=False):
+        """Connect to QEMU's serial port (tcp) or wrap stdin/stdout (pipe).
+
+        With io_uring, TCP reads go through IoUringStream when the platform
+        supports it, falling back to plain asyncio sockets otherwise.
+        """
+        if mode == "pipe":
+            # The transports close the files they are given, so hand them
+            # duplicates and leave sys.stdin/sys.stdout alone. Pipe
+            # transports only take pipes, sockets and terminals; redirected
+            # regular files go through worker threads instead.
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader(limit=SERIAL_LINE_LIMIT)
+            stdin, stdout = sys.stdin.fileno(), sys.stdout.fileno()
+            if is_regular_file(stdin):
+                read_transport = RegularFileReader(stdin, reader)
+            else:
+                read_transport, _ = await loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader),
+                    os.fdopen(os.dup(stdin), "rb", buffering=0))
+            if is_regular_file(stdout):
+                writer = RegularFileWriter(stdout)
+            else:
+                write_transport, protocol = await loop.connect_write_pipe(
+                    asyncio.streams.FlowControlMixin,
+                    os.fdopen(os.dup(stdout), "wb", buffering=0))
+                writer = asyncio.StreamWriter(write_transport, protocol, reader, loop)
+            return cls(mode, reader, writer, read_transport)
+
+        log.info("Connecting to QEMU serial at %s:%d...", host, port)
+        loop = asyncio.get_running_loop()
+        for attempt in range(connect_retries):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, (host, port))
+                break
+            except ConnectionRefusedError:
+                sock.close()
+                if attempt < connect_retries - 1:
+                    await asyncio.sleep(1)
+        else:
+            log.error("ERROR: Could not connect to QEMU serial port.")
             sys.exit(1)
-        # pipe mode uses stdin/stdout
-
-    def readline(self):
-        """Read a line (terminated by \\n) from serial."""
-        if self.mode == "tcp":
-            buf = b""
+        log.info("Connected.")
+        # Protocol messages are tiny; send them immediately rather than
+        # letting Nagle hold them back waiting for an ACK.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        if io_uring and sys.platform == "linux":
+            try:
+                stream = IoUringStream(sock)
+                log.info("Using io_uring for serial reads.")
+                return cls(mode, stream.reader, stream)
+            except ImportError:
+                log.warning("WARNING: 'liburing' package not installed; using "
+                            "asyncio sockets. Run: pip install liburing")
+            except OSError as e:
+                log.warning("WARNING: io_uring unavailable (%s); using asyncio sockets", e)
+        elif io_uring:
+            log.warning("WARNING: io_uring is Linux-only; using asyncio sockets")
+        reader, writer = await asyncio.open_connection(sock=sock, limit=SERIAL_LINE_LIMIT)
+        return cls(mode, reader, writer, sock=sock)
+
+    async def readline_bytes(self, timeout=None):
+        """Read a raw line (terminated by \\n) from serial, without the \\n.
+
+        Returns None if timeout seconds pass without a complete line.
+        """
+        return await self.read_until(b"\n", timeout)
+
+    async def read_until(self, delim, timeout=None):
+        """Read a frame terminated by delim from serial, without delim.
+
+        The kernel currently only sends \\n-terminated lines, but this lets
+        other framings (e.g. EOT-terminated chunks) share the same buffered
+        reader. Returns None if timeout seconds pass without a complete frame.
+        Frames longer than SERIAL_LINE_LIMIT are cut down to that length.
+        """
+        try:
+            frame = await asyncio.wait_for(self.reader.readuntil(delim), timeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Serial connection closed")
+        except asyncio.LimitOverrunError as e:
+            return await self._read_oversized(delim, e.consumed)
+        return frame[:-len(delim)]
+
+    async def _read_oversized(self, delim, consumed):
+        """Keep the start of an over-long frame and discard the rest of it.
+
+        consumed is how much of the buffered frame readuntil() has already
+        scanned. The remainder is read a buffer's worth at a time, so a
+        runaway line never has to fit in memory.
+        """
+        try:
+            frame = await self.reader.readexactly(consumed)
+            dropped = 0
             while True:
-                c = self.sock.recv(1)
-                if not c:
-                    raise ConnectionError("Serial connection closed")
-                if c == b"\n":
-                    return buf.decode("utf-8", errors="replace")
-                buf += c
-        else:
-            return sys.stdin.readline().rstrip("\n")
-
-    def write(self, data):
+                try:
+                    dropped += len(await self.reader.readuntil(delim)) - len(delim)
+                    break
+                except asyncio.LimitOverrunError as e:
+                    dropped += len(await self.reader.readexactly(e.consumed))
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Serial connection closed")
+        dropped += max(0, len(frame) - SERIAL_LINE_LIMIT)
+        log.warning("[serial] dropped %d bytes of an over-long line", dropped)
+        return frame[:SERIAL_LINE_LIMIT]
+
+    async def write(self, data):
         """Write bytes to serial."""
         if isinstance(data, str):
             data = data.encode("utf-8")
+        await self.write_parts([data])
+
+    async def write_parts(self, parts):
+        """Write a sequence of bytes objects to serial without joining them."""
+        if self._sock is not None:
+            # The transport closes the socket once the kernel hangs up
+            if self.writer.transport.is_closing():
+                raise ConnectionError("Serial connection closed")
+            # Before Python 3.12 the socket transport's writelines() joins
+            # its arguments, so send straight from the socket when nothing
+            # is queued in the transport ahead of us, and queue only what
+            # doesn't fit.
+            if HAVE_SENDMSG and not self.writer.transport.get_write_buffer_size():
+                rest = sendmsg_nowait(self._sock, parts)
+                if rest:
+                    self.writer.write(b"".join(rest))
+                await self.writer.drain()
+                return
+        self.writer.writelines(parts)
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
         if self.mode == "tcp":
-            self.sock.sendall(data)
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
         else:
-            sys.stdout.buffer.write(data)
-            sys.stdout.buffer.flush()
+            self._read_transport.close()
+            # stdin/stdout share their file descriptions with our parent
+            # (often a terminal); don't leave them non-blocking.
+            os.set_blocking(sys.stdin.fileno(), True)
+            os.set_blocking(sys.stdout.fileno(), True)
+
+
+def log_serial(line):
+    """Log a raw line received from the kernel at debug level.
+
+    Most lines are keystroke echoes, so skip decoding them entirely unless
+    they will actually be shown.
+    """
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[serial] %s", line.decode("utf-8", errors="replace"))
+
+
+def start_reply(coro):
+    """Run a send_answer/send_batch coroutine as a task, logging failures.
+
+    Nothing else awaits these tasks for their result, so without this an
+    exception would only surface when the task is garbage collected.
+    """
+    task = asyncio.create_task(coro)
+    task.add_done_callback(log_reply_failure)
+    return task
+
+
+def log_reply_failure(task):
+    if task.cancelled() or task.exception() is None:
+        return
+    # A hang-up is reported by serve() when its own read fails
+    if not isinstance(task.exception(), ConnectionError):
+        log.error("[reply failed]", exc_info=task.exception())
+
+
+async def send_answer(serial, client, query, system, cache, after=None):
+    """Stream the answer to one query to the kernel.
+
+    after is the task sending the previous answer, so answers go out in
+    the order the queries arrived. A failure there has already been logged
+    and must not stop this answer going out.
+    """
+    if after is not None:
+        await asyncio.gather(after, return_exceptions=True)
+    if client is None:
+        mock = f"[Mock] You said: {query}"
+        await serial.write_parts([b"A:", mock.encode("utf-8"), EOT])
+    else:
+        if query.startswith(NOCACHE_PREFIX):
+            query = query[len(NOCACHE_PREFIX):].lstrip()
+            cache = None
+        # Forward text to the kernel as it is generated. The kernel blocks
+        # until it sees EOT, so once the answer has started, a failure to
+        # produce the rest of it is reported in-band. Serial errors still
+        # propagate: there is no one left to answer.
+        await serial.write(b"A:")
+        chunks = query_claude(client, query, system, cache)
+        while True:
+            try:
+                text = await anext(chunks)
+            except StopAsyncIteration:
+                break
+            except Exception as e:
+                log.error("[proxy error] %s", e)
+                await serial.write(f"[Proxy Error: {e}]")
+                break
+            await serial.write(text)
+        await serial.write(EOT)
+    log.info("[response sent]")
+
+
+async def send_batch(serial, client, queries, system, cache, after=None):
+    """Answer a batch of queries concurrently and send the answers in order."""
+    if client is not None:
+        try:
+            responses = await answer_batch(client, queries, system, cache)
+        except Exception as e:
+            log.error("[proxy error] %s", e)
+            responses = [f"[Proxy Error: {e}]"] * len(queries)
+    else:
+        responses = [f"[Mock] You said: {query}" for query in queries]
+    if after is not None:
+        await asyncio.gather(after, return_exceptions=True)
+    for response in responses:
+        await serial.write_parts([b"A:", response.encode("utf-8"), EOT])
+    log.info("[batch of %d sent]", len(queries))
+
+
+async def serve(args):
+    """Run the proxy until the kernel says BYE or the connection drops."""
+    cache = None
+    client = None
+    pinger = None
+    if not args.no_api:
+        client = create_anthropic_client(args.prompt_cache_ttl)
+        pinger = asyncio.create_task(keepalive(client))
+        if not args.no_cache:
+            cache = open_semantic_cache(args.cache_db)
+    system = system_blocks(args.prompt_cache_ttl)
 
-    def close(self):
-        if self.mode == "tcp":
-            self.sock.close()
+    mode = "pipe" if args.pipe else "tcp"
+    serial = await SerialConnection.open(mode, args.host, args.port,
+                                         args.connect_retries, args.io_uring)
+
+    sys.stderr.buffer.write(BANNER_BYTES)
+    sys.stderr.buffer.flush()
+    log.info("Waiting for kernel boot...")
+
+    # Answers are sent from tasks so the kernel's echo of a response is
+    # read (and logged) while the response is still streaming in.
+    reply = None
+    pending = []
+    try:
+        try:
+            # Wait for kernel READY signal
+            while True:
+                line = await serial.readline_bytes()
+                log_serial(line)
+                if line.strip() == b"READY":
+                    log.info("Kernel ready! Type in the QEMU window.\n")
+                    break
+
+            # Main loop: listen for Q: queries and BYE
+            while True:
+                if len(pending) >= args.batch > 0:
+                    line = None  # batch is full
+                else:
+                    line = await serial.readline_bytes(BATCH_WINDOW if pending else None)
+                if line is None:
+                    # Nothing else queued up behind these queries; answer them
+                    reply = start_reply(
+                        send_batch(serial, client, pending, system, cache, reply))
+                    pending = []
+                    continue
+                log_serial(line)
+
+                # Frame on the raw bytes; only the query payload needs decoding
+                if line.startswith(b"Q:"):
+                    query = line[2:].decode("utf-8", errors="replace")
+                    log.info("[query] %s", query)
+
+                    if args.batch:
+                        pending.append(query)
+                    else:
+                        reply = start_reply(
+                            send_answer(serial, client, query, system, cache, reply))
+
+                elif line.strip() == b"BYE":
+                    log.info("Session ended. The weird machine has halted.")
+                    break
+
+                # Otherwise it's echo/status output — already logged above
+
+        except ConnectionError as e:
+            log.info("\nProxy shutting down. (%s)", e)
+
+        # Answer everything already asked for. A scripted producer may send
+        # its last queries right before BYE, or close only its sending side.
+        if pending:
+            reply = start_reply(
+                send_batch(serial, client, pending, system, cache, reply))
+        if reply is not None:
+            await asyncio.gather(reply, return_exceptions=True)
+    finally:
+        for task in (reply, pinger):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in (reply, pinger) if task is not None),
+                             return_exceptions=True)
+        await serial.close()
+        if cache is not None:
+            cache.close()
+        if client is not None:
+            await client.close()
+
+
+def non_negative_int(text):
+    """argparse type for counts where 0 means "off"."""
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, not {value}")
+    return value
+
+
+def positive_int(text):
+    """argparse type for counts that must be at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be 1 or more, not {value}")
+    return value
 
 
 def main():
@@ -125,58 +935,38 @@ def main():
                         help="Host for QEMU serial (default: 127.0.0.1)")
     parser.add_argument("--pipe", action="store_true",
                         help="Use stdin/stdout instead of TCP")
+    parser.add_argument("--io-uring", action="store_true",
+                        help="Read the TCP serial port through io_uring "
+                             "(Linux, needs the 'liburing' package)")
+    parser.add_argument("--connect-retries", type=positive_int, default=30, metavar="N",
+                        help="Attempts, one second apart, to reach the QEMU "
+                             "serial port (default: 30)")
     parser.add_argument("--no-api", action="store_true",
                         help="Mock mode: echo queries instead of calling Claude")
+    parser.add_argument("--prompt-cache-ttl", type=int, choices=(5, 60), default=5,
+                        help="System prompt cache lifetime in minutes (default: 5)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the local semantic response cache")
+    parser.add_argument("--cache-db", default=CACHE_DB,
+                        help=f"Semantic response cache database (default: {CACHE_DB})")
+    parser.add_argument("--batch", type=non_negative_int, default=0, metavar="N",
+                        help="Collect up to N queued queries and send them to "
+                             "Claude concurrently (for scripted runs)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Also log every line the kernel sends, including echoes")
     args = parser.parse_args()
 
-    if args.no_api:
-        client = None
-    else:
-        client = create_anthropic_client()
-
-    mode = "pipe" if args.pipe else "tcp"
-    serial = SerialConnection(mode, args.host, args.port)
-
-    print(BANNER, file=sys.stderr)
-    print("Waiting for kernel boot...", file=sys.stderr)
+    # Configure only our logger so the HTTP libraries stay quiet
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    log.propagate = False
 
     try:
-        # Wait for kernel READY signal
-        while True:
-            line = serial.readline()
-            print(f"[serial] {line}", file=sys.stderr)
-            if line.strip() == "READY":
-                print("Kernel ready! Type in the QEMU window.\n", file=sys.stderr)
-                break
-
-        # Main loop: listen for Q: queries and BYE
-        while True:
-            line = serial.readline()
-            print(f"[serial] {line}", file=sys.stderr)
-
-            if line.startswith("Q:"):
-                query = line[2:]
-                print(f"[query] {query}", file=sys.stderr)
-
-                if client is not None:
-                    response = query_claude(client, query)
-                else:
-                    response = f"[Mock] You said: {query}"
-
-                # Send response to kernel
-                serial.write(b"A:" + response.encode("utf-8") + EOT)
-                print(f"[response sent]", file=sys.stderr)
-
-            elif line.strip() == "BYE":
-                print("Session ended. The weird machine has halted.", file=sys.stderr)
-                return
-
-            # Otherwise it's echo/status output — already logged above
-
-    except (KeyboardInterrupt, ConnectionError) as e:
-        print(f"\nProxy shutting down. ({e})", file=sys.stderr)
-    finally:
-        serial.close()
+        asyncio.run(serve(args))
+    except KeyboardInterrupt as e:
+        log.info("\nProxy shutting down. (%s)", e)
 
 
 if __name__ == "__main__":
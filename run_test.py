@@ -10,17 +10,14 @@ import time
 PORT = 4322
 KERNEL = "build/pagefault_claude"
 TIMEOUT = 15
+CONNECT_TIMEOUT = 10
 
 
-def readline(sock):
-    buf = b""
-    while True:
-        c = sock.recv(1)
-        if not c:
-            raise ConnectionError("closed")
-        buf += c
-        if c == b"\n":
-            return buf.decode(errors="replace").rstrip("\n")
+def readline(rfile):
+    line = rfile.readline()
+    if not line:
+        raise ConnectionError("closed")
+    return line.rstrip(b"\n").decode(errors="replace")
 
 
 def main():
@@ -48,25 +45,33 @@ def main():
 
     # Connect (QEMU waits for us with wait=on, then starts the guest)
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    for _ in range(20):
+    # No Nagle delay on the small test writes
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # The listener appears a few ms after QEMU starts, so poll finely
+    # rather than sleeping in large steps.
+    sock.settimeout(CONNECT_TIMEOUT)
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
         try:
             sock.connect(("127.0.0.1", PORT))
             print("Connected to serial port")
             break
         except ConnectionRefusedError:
-            time.sleep(0.5)
-    else:
-        print("FAILED to connect")
-        qemu.kill()
-        sys.exit(1)
+            if qemu.poll() is not None or time.monotonic() >= deadline:
+                print("FAILED to connect")
+                qemu.kill()
+                sys.exit(1)
+            time.sleep(0.01)
 
     sock.settimeout(TIMEOUT)
+    rfile = sock.makefile("rb", buffering=8192)
 
     try:
         # Wait for READY
         print("Waiting for kernel boot...")
         while True:
-            line = readline(sock)
+            line = readline(rfile)
             print(f"  << {line}")
             if line.strip() == "READY":
                 print("=== KERNEL READY ===\n")
@@ -76,7 +81,7 @@ def main():
         print("TEST 1: Send 'hello'")
         sock.sendall(b"hello\n")
         while True:
-            line = readline(sock)
+            line = readline(rfile)
             print(f"  << {line}")
             if line.startswith("Q:"):
                 query = line[2:]
@@ -95,7 +100,7 @@ def main():
         print("\nTEST 2: Send 'world'")
         sock.sendall(b"world\n")
         while True:
-            line = readline(sock)
+            line = readline(rfile)
             print(f"  << {line}")
             if line.startswith("Q:"):
                 query = line[2:]
@@ -116,7 +121,7 @@ def main():
         print("  >> Sending 'alive' to verify machine is still running")
         sock.sendall(b"alive\n")
         while True:
-            line = readline(sock)
+            line = readline(rfile)
             print(f"  << {line}")
             if line.startswith("Q:"):
                 query = line[2:]
@@ -132,7 +137,7 @@ def main():
         print("\nTEST 4: Send 'quit'")
         sock.sendall(b"quit\n")
         while True:
-            line = readline(sock)
+            line = readline(rfile)
             print(f"  << {line}")
             if line.strip() == "BYE":
                 print("  >> Got BYE")
@@ -154,6 +159,7 @@ def main():
         print(f"\nFAIL: {e}")
         sys.exit(1)
     finally:
+        rfile.close()
         sock.close()
         qemu.kill()
         qemu.wait()
@@ -23,20 +23,18 @@ PORT = 4321
 EOT = b"\x04"
 
 
-def readline(sock):
-    """Read a line from the socket (until \\n)."""
-    buf = b""
-    while True:
-        c = sock.recv(1)
-        if not c:
-            raise ConnectionError("Connection closed")
-        if c == b"\n":
-            return buf.decode("utf-8", errors="replace")
-        buf += c
+def readline(rfile):
+    """Read a line from the socket's buffered reader (until \\n)."""
+    line = rfile.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    return line.rstrip(b"\n").decode("utf-8", errors="replace")
 
 
 def main():
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
     print(f"Connecting to {HOST}:{PORT}...")
 
     for attempt in range(30):
@@ -51,9 +49,11 @@ def main():
         print("ERROR: Could not connect.", file=sys.stderr)
         sys.exit(1)
 
+    rfile = sock.makefile("rb", buffering=8192)
+
     # Read until READY
     while True:
-        line = readline(sock)
+        line = readline(rfile)
         print(f"[kernel] {line}")
         if line.strip() == "READY":
             print("Kernel ready! Type in the QEMU window.\n")
@@ -62,7 +62,7 @@ def main():
     # Main loop: handle Q: queries and BYE
     try:
         while True:
-            line = readline(sock)
+            line = readline(rfile)
             print(f"[kernel] {line}")
 
             if line.startswith("Q:"):
@@ -81,6 +81,7 @@ def main():
     except (KeyboardInterrupt, ConnectionError, EOFError):
         print("\nTest ended.")
     finally:
+        rfile.close()
         sock.close()
 
 